@@ -52,6 +52,7 @@ def acquire_and_preprocess_3dep_dems(
     repair=False,
     skip_polygons=False,
     target_projection='EPSG:5070',
+    force_jobs=False,
 ):
     '''
     Overview
@@ -108,6 +109,11 @@ def acquire_and_preprocess_3dep_dems(
 
         - target_projection (String)
             Projection of the output DEMS and polygons (if included)
+
+        - force_jobs (bool):
+            More than 15 jobs is not allowed unless this is True. Each job opens another
+            connection to USGS, and too many at once can leave files partially downloaded
+            with no notification or warning.
     '''
     # -------------------
     # Validation
@@ -120,27 +126,14 @@ def acquire_and_preprocess_3dep_dems(
             ' value accordingly.'
         )
 
-    if number_of_jobs > 15:
-        print("")
-        print(f"You have asked for {number_of_jobs} jobs\n")
-        print("For each core, it opens up another extenal connection.")
-        print(" But if you try to download more files simultaneously, many files an be partially downloaded")
-        print(
-            " with no notification or warning. It is recommended to slow down the job numbers to ensure stability."
+    if (number_of_jobs > 15) and (force_jobs is False):
+        raise ValueError(
+            f'You have asked for {number_of_jobs} jobs. For each core, it opens up another external'
+            ' connection, and if you try to download more files simultaneously, many files can be'
+            ' partially downloaded with no notification or warning. It is recommended to keep the'
+            ' number of jobs at 15 or less to ensure stability. Add the -fj (force jobs) flag if you'
+            ' want to keep your original job number.'
         )
-        print("")
-        print(" Type 'CONTINUE' if you want to keep your original job numbers")
-        print("      'MAX' if you want change your job count to 15")
-        print("      any other value to abort.")
-        resp = input(">> ").lower()
-
-        if resp == "max":
-            number_of_jobs = 15
-        elif resp != "continue":
-            print("Program aborted")
-            sys.exit(1)
-        print(f".. Continuing with {number_of_jobs} jobs")
-    print("")
 
     if not os.path.exists(extent_file_path):
         raise ValueError(f'extent_file_path value of {extent_file_path}' ' not set to a valid path')
@@ -218,17 +211,47 @@ def __download_usgs_dems(extent_files, output_folder_path, number_of_jobs, repai
         - block size (256) (sometimes we use 512)
         - cblend 6 add's a small buffer when pulling down the tif (ensuring seamless
           overlap at the borders.)
+        - The --config values tune /vsicurl/ against the USGS S3 bucket: adjacent ranges are
+          merged into one request, and the directory listing GDAL would otherwise fetch for
+          each source tif is skipped.
+        - GDAL_HTTP_MAX_RETRY / GDAL_HTTP_RETRY_DELAY retry throttled or failed (429 / 5xx) range
+          reads instead of failing the whole DEM. GDAL roughly doubles the delay (with jitter) on
+          each retry. This cuts down on the communication fails that otherwise need a repair run.
+        - CPL_VSIL_CURL_CACHE_SIZE raises the /vsicurl/ chunk cache (one cache shared by all files
+          opened in the gdalwarp process) from 16 MB to 128 MB per job. The warp chunks and the
+          cblend / bilinear edges re-read the same source blocks, which then no longer go back to S3.
+        - CPL_VSIL_CURL_ALLOWED_EXTENSIONS stops GDAL from probing S3 for sidecar files
+          (.aux.xml, .ovr, .msk, ...) of every source tif, and CPL_VSIL_CURL_CHUNK_SIZE raises the
+          range read size from 16 KB to 512 KB so each source block is fetched in far fewer requests.
+        - ZSTD with the floating point predictor (3) compresses the Float32 DEMs smaller and
+          decodes faster than LZW.
+        - NUM_THREADS lets GDAL compress blocks on multiple threads, and -multi with
+          -wo NUM_THREADS runs the bilinear resampling on multiple threads while the next chunk
+          is read and written. With -multi both thread pools run at the same time, so each job's
+          share of the cpus is split between them (compression gets half, warping the rest).
+          Each job then uses about its share plus one I/O thread.
 
     '''
 
     print("==========================================================")
     print("-- Downloading USGS DEMs Starting")
 
+    threads_per_job = max(1, os.cpu_count() // number_of_jobs)
+    compress_threads = max(1, threads_per_job // 2)
+    warp_threads = max(1, threads_per_job - compress_threads)
+
     base_cmd = 'gdalwarp {0} {1}'
     base_cmd += ' -cutline {2} -crop_to_cutline -ot Float32 -r bilinear'
     base_cmd += ' -of "GTiff" -overwrite -co "BLOCKXSIZE=256" -co "BLOCKYSIZE=256"'
-    base_cmd += ' -co "TILED=YES" -co "COMPRESS=LZW" -co "BIGTIFF=YES" -tr 10 10'
+    base_cmd += ' -co "TILED=YES" -co "COMPRESS=ZSTD" -co "PREDICTOR=3" -co "BIGTIFF=YES" -tr 10 10'
+    base_cmd += f' -co "NUM_THREADS={compress_threads}" -multi -wo "NUM_THREADS={warp_threads}"'
     base_cmd += ' -t_srs {3} -cblend 6'
+    base_cmd += ' --config GDAL_HTTP_MERGE_CONSECUTIVE_RANGES YES'
+    base_cmd += ' --config GDAL_DISABLE_READDIR_ON_OPEN EMPTY_DIR'
+    base_cmd += ' --config GDAL_HTTP_MAX_RETRY 5 --config GDAL_HTTP_RETRY_DELAY 2'
+    base_cmd += ' --config CPL_VSIL_CURL_CACHE_SIZE 134217728'
+    base_cmd += ' --config CPL_VSIL_CURL_ALLOWED_EXTENSIONS ".tif,.vrt"'
+    base_cmd += ' --config CPL_VSIL_CURL_CHUNK_SIZE 524288'
 
     """
     e.q. gdalwarp
@@ -236,20 +259,58 @@ def __download_usgs_dems(extent_files, output_folder_path, number_of_jobs, repai
        /data/inputs/usgs/3dep_dems/10m/HUC8_12090301_dem.tif
        -cutline /data/inputs/wbd/HUC8/HUC8_12090301.gpkg
        -crop_to_cutline -ot Float32 -r bilinear -of "GTiff" -overwrite -co "BLOCKXSIZE=256" -co "BLOCKYSIZE=256"
-       -co "TILED=YES" -co "COMPRESS=LZW" -co "BIGTIFF=YES" -tr 10 10 -t_srs ESRI:102039 -cblend 6
+       -co "TILED=YES" -co "COMPRESS=ZSTD" -co "PREDICTOR=3" -co "BIGTIFF=YES" -tr 10 10
+       -co "NUM_THREADS=2" -multi -wo "NUM_THREADS=2" -t_srs ESRI:102039 -cblend 6
+       --config GDAL_HTTP_MERGE_CONSECUTIVE_RANGES YES
+       --config GDAL_DISABLE_READDIR_ON_OPEN EMPTY_DIR
+       --config GDAL_HTTP_MAX_RETRY 5 --config GDAL_HTTP_RETRY_DELAY 2
+       --config CPL_VSIL_CURL_CACHE_SIZE 134217728
+       --config CPL_VSIL_CURL_ALLOWED_EXTENSIONS ".tif,.vrt"
+       --config CPL_VSIL_CURL_CHUNK_SIZE 524288
     """
 
+    # In repair mode, one directory listing replaces the exists probe per extent file. Only the
+    # DEMs that match an extent file are stat'ed for their size (is_file uses the listing itself).
+    existing_dem_sizes = {}
+    if repair:
+        dem_file_names = {__get_dem_file_name(extent_file) for extent_file in extent_files}
+        with os.scandir(output_folder_path) as dir_entries:
+            existing_dem_sizes = {
+                entry.name: entry.stat().st_size
+                for entry in dir_entries
+                if (entry.name in dem_file_names) and entry.is_file()
+            }
+
     with ProcessPoolExecutor(max_workers=number_of_jobs) as executor:
         executor_dict = {}
 
         for idx, extent_file in enumerate(extent_files):
+            # In repair mode, check for an existing DEM here, before a process (and its
+            # connection to USGS) is started for it.
+            if repair:
+                target_file_name_raw = __get_dem_file_name(extent_file)
+
+                # It does happen where the final output size can be very small (or all no-data)
+                # which is related to to the spatial extents of the dem and the vrt combined.
+                # so, super small .tifs are correct.
+                if target_file_name_raw in existing_dem_sizes:
+                    if existing_dem_sizes[target_file_name_raw] < 1000000:
+                        os.remove(os.path.join(output_folder_path, target_file_name_raw))
+                    else:
+                        msg = (
+                            f" - Downloading -- {target_file_name_raw}"
+                            " - Skipped (already exists (see retry flag))"
+                        )
+                        print(msg)
+                        logging.info(msg)
+                        continue
+
             download_dem_args = {
                 'extent_file': extent_file,
                 'output_folder_path': output_folder_path,
                 'download_url': __USGS_3DEP_10M_VRT_URL,
                 'target_projection': target_projection,
                 'base_cmd': base_cmd,
-                'repair': repair,
             }
 
             try:
@@ -273,9 +334,15 @@ def __download_usgs_dems(extent_files, output_folder_path, number_of_jobs, repai
     print("==========================================================")
 
 
-def download_usgs_dem_file(
-    extent_file, output_folder_path, download_url, target_projection, base_cmd, repair
-):
+def __get_dem_file_name(extent_file):
+    '''
+    The output dem file name for an extent file. ie) HUC6_120903.gpkg becomes HUC6_120903_dem.tif
+    '''
+    basic_file_name = os.path.basename(extent_file).split('.')[0]
+    return f"{basic_file_name}_dem.tif"
+
+
+def download_usgs_dem_file(extent_file, output_folder_path, download_url, target_projection, base_cmd):
     '''
     Process:
     ----------
@@ -296,29 +363,16 @@ def download_usgs_dem_file(
             ie) EPSG:5070 or EPSG:2276, etc
         - base_cmd (str)
              The basic GDAL command with string formatting wholes for key values.
-        - repair (bool)
-             If True, and the file does not exist or is too small (under 10mb),
-             it will attempt to download.
+
+    Notes:
+        - Repair mode is handled by __download_usgs_dems before this is called, so
+          existing DEMs never get a process.
 
     '''
 
-    basic_file_name = os.path.basename(extent_file).split('.')[0]
-    target_file_name_raw = f"{basic_file_name}_dem.tif"  # as downloaded
+    target_file_name_raw = __get_dem_file_name(extent_file)  # as downloaded
     target_path_raw = os.path.join(output_folder_path, target_file_name_raw)
 
-    # It does happen where the final output size can be very small (or all no-data)
-    # which is related to to the spatial extents of the dem and the vrt combined.
-    # so, super small .tifs are correct.
-
-    if (repair) and (os.path.exists(target_path_raw)):
-        if os.stat(target_path_raw).st_size < 1000000:
-            os.remove(target_path_raw)
-        else:
-            msg = f" - Downloading -- {target_file_name_raw} - Skipped (already exists (see retry flag))"
-            print(msg)
-            logging.info(msg)
-            return
-
     msg = f" - Downloading -- {target_file_name_raw} - Started"
     print(msg)
     logging.info(msg)
@@ -343,12 +397,15 @@ def download_usgs_dem_file(
         print(msg)
         logging.info(msg)
 
-        if process.stderr != "":
-            if "ERROR" in process.stderr.upper():
-                msg = f" - Downloading -- {target_file_name_raw}" f"  ERROR -- details: ({process.stderr})"
-                print(msg)
-                logging.error(msg)
-                os.remove(target_path_raw)
+        # GDAL starts real failures with "ERROR <n>:". Warnings can still mention errors, such as the
+        # /vsicurl/ retry notice "Warning 1: HTTP error code: 503 - <url>. Retrying again in N secs",
+        # and a read that succeeded on retry must keep its output.
+        error_lines = [line for line in process.stderr.splitlines() if line.startswith("ERROR")]
+        if len(error_lines) > 0:
+            msg = f" - Downloading -- {target_file_name_raw}" f"  ERROR -- details: ({process.stderr})"
+            print(msg)
+            logging.error(msg)
+            os.remove(target_path_raw)
         else:
             msg = f" - Downloading -- {target_file_name_raw} - Complete"
             print(msg)
@@ -376,9 +433,11 @@ def polygonize(target_output_folder_path):
     if len(dem_files) == 0:
         raise Exception("There are no DEMs to polygonize")
 
-    dem_gpkgs = gpd.GeoDataFrame()
+    # Collect each outline and concat once at the end (concat inside the loop re-copies every
+    # previous outline on each pass)
+    dem_gdfs = []
 
-    for n, dem_file in enumerate(dem_files):
+    for dem_file in dem_files:
         print(f"Polygonizing: {dem_file}")
         edge_tif = f'{os.path.splitext(dem_file)[0]}_edge.tif'
         edge_gpkg = f'{os.path.splitext(edge_tif)[0]}.gpkg'
@@ -410,16 +469,12 @@ def polygonize(target_output_folder_path):
         # Polygonize constant valued raster
         subprocess.run(['gdal_polygonize.py', '-8', edge_tif, '-q', '-f', 'GPKG', edge_gpkg])
 
-        gdf = gpd.read_file(edge_gpkg)
-
-        if n == 0:
-            dem_gpkgs = gdf
-        else:
-            dem_gpkgs = pd.concat([dem_gpkgs, gdf])
+        dem_gdfs.append(gpd.read_file(edge_gpkg))
 
         os.remove(edge_tif)
         os.remove(edge_gpkg)
 
+    dem_gpkgs = pd.concat(dem_gdfs)
     dem_gpkgs['DN'] = 1
     dem_dissolved = dem_gpkgs.dissolve(by='DN')
     dem_dissolved.to_file(dem_domain_file, driver='GPKG', engine='fiona')
@@ -460,7 +515,7 @@ if __name__ == '__main__':
         python3 /foss_fim/data/usgs/acquire_and_preprocess_3dep_dems.py
             -e /data/inputs/wbd/wbd/HUC8_South_Alaska/
             -t /data/inputs/3dep_dems/10m_South_Alaska/
-            -j 20
+            -j 20 -fj
 
     or
         python3 /foss_fim/data/usgs/acquire_and_preprocess_3dep_dems.py
@@ -535,6 +590,16 @@ if __name__ == '__main__':
         type=int,
     )
 
+    parser.add_argument(
+        '-fj',
+        '--force_jobs',
+        help='OPTIONAL: If included, more than 15 jobs are allowed. Without it, the number of jobs'
+        ' is limited to 15 as more simultaneous USGS connections can leave partially downloaded files.',
+        required=False,
+        action='store_true',
+        default=False,
+    )
+
     parser.add_argument(
         '-rp',
         '--repair',
@@ -1,14 +1,15 @@
 #!/usr/bin/env python3
 import argparse
 import os
-import urllib
-import urllib.request
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import pandas as pd
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 
 load_dotenv()
@@ -16,6 +17,17 @@ USGS_DOWNLOAD_URL = os.getenv("USGS_DOWNLOAD_URL")
 USGS_METADATA_URL = os.getenv("USGS_METADATA_URL")
 EVALUATED_SITES_CSV = os.getenv("EVALUATED_SITES_CSV")
 
+# All USGS calls share one session so connections are pooled and kept alive between requests.
+# Connection errors and throttled / 5xx responses are retried with exponential backoff (0, 2, 4, 8, 16 secs).
+SESSION = requests.Session()
+retry_adapter = HTTPAdapter(
+    max_retries=Retry(total=5, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
+)
+SESSION.mount('https://', retry_adapter)
+SESSION.mount('http://', retry_adapter)
+# (connect, read) timeout in seconds, so a stalled USGS socket raises (and is retried) instead of hanging.
+TIMEOUT = (5, 30)
+
 
 ###############################################################################
 # Get all usgs grids available for download. This step is required because the grid metadata API returns gridID as an integer and truncates leading zeros found in grid names.
@@ -32,14 +44,14 @@ def get_all_usgs_gridnames():
 
     # Grid names are split between 4 websites
     sites = ['grids_1', 'grids_2', 'grids_3', 'grids_4']
+    urls = [f'{USGS_METADATA_URL}/server/rest/services/FIMMapper/{i}/MapServer?f=pjson' for i in sites]
+    # The sites are independent, so request them concurrently (map keeps the site order).
+    with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+        site_jsons = list(executor.map(lambda url: SESSION.get(url, timeout=TIMEOUT).json(), urls))
     # Append all grid names to this variable
     grid_names = []
     # loop through each site and append the grid name to a list.
-    for i in sites:
-        # Get gridnames
-        url = f'{USGS_METADATA_URL}/server/rest/services/FIMMapper/{i}/MapServer?f=pjson'
-        response = requests.get(url)
-        site_json = response.json()
+    for site_json in site_jsons:
         info = site_json['layers']
         # Loop through all grid info and extract the grid name.
         for i in info:
@@ -55,6 +67,37 @@ def get_all_usgs_gridnames():
     return grid_lookup
 
 
+###############################################################################
+# Download a single file over the shared session
+###############################################################################
+def download_file(url, saved_path):
+    '''
+    Stream a file from url to saved_path using the shared session (replaces urllib.request.urlretrieve,
+    which opened a new connection for every file).
+
+    The file is streamed to a temporary ".part" name and only renamed to saved_path once complete, so a
+    download that fails part way never leaves a truncated file that later runs would treat as existing.
+
+    Parameters
+    ----------
+    url : STR
+        URL of the file to download.
+    saved_path : pathlib.Path
+        Output path of the downloaded file.
+    '''
+    part_path = saved_path.with_suffix(saved_path.suffix + '.part')
+    try:
+        with SESSION.get(url, stream=True, timeout=TIMEOUT) as response:
+            response.raise_for_status()
+            with open(part_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=1024 * 1024):
+                    f.write(chunk)
+        os.replace(part_path, saved_path)
+    finally:
+        if part_path.exists():
+            part_path.unlink()
+
+
 ###############################################################################
 # Get USGS Site metadata
 ###############################################################################
@@ -79,7 +122,7 @@ def usgs_site_metadata(code):
     # Get site metadata from USGS API using ahps code
     site_url = f'{USGS_METADATA_URL}/server/rest/services/FIMMapper/sites/MapServer/0/query?where=AHPS_ID+%3D+%27{code}%27&text=&objectIds=&time=&geometry=&geometryType=esriGeometryEnvelope&inSR=&spatialRel=esriSpatialRelIntersects&relationParam=&outFields=*&returnGeometry=false&returnTrueCurves=false&maxAllowableOffset=&geometryPrecision=&outSR=&having=&returnIdsOnly=false&returnCountOnly=false&orderByFields=&groupByFieldsForStatistics=&outStatistics=&returnZ=false&returnM=false&gdbVersion=&historicMoment=&returnDistinctValues=false&resultOffset=&resultRecordCount=&queryByDistance=&returnExtentOnly=false&datumTransformation=&parameterValues=&rangeValues=&quantizationParameters=&f=pjson'
     # Get data from API
-    response = requests.get(site_url)
+    response = SESSION.get(site_url, timeout=TIMEOUT)
     # If response is valid, then get metadata and save to dictionary
     if response.ok:
         response_json = response.json()
@@ -145,7 +188,7 @@ def obtain_usgs_data(workspace):
                 if not saved_grid_path.is_file():
                     # If file hasn't been downloaded, download it. If there was an error downloading, make note.
                     try:
-                        urllib.request.urlretrieve(url, saved_grid_path)
+                        download_file(url, saved_grid_path)
                         message = f'{gridname} downloaded'
                         all_messages.append(message)
                     except Exception as e: